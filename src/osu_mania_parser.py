@@ -5,16 +5,53 @@ A module that converts osu!mania beatmaps into Python objects.
 """
 
 from __future__ import annotations
+import mmap
 import os
-from typing import List, Optional, Literal
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager
 from dataclasses import dataclass, field
+from functools import lru_cache
+from operator import attrgetter
+from typing import AnyStr, Callable, Dict, Iterator, List, Optional, Literal, Set, Tuple, Union
 
 
-# Type alias for hit sounds
-HitSound = List[Literal['normal', 'whistle', 'finish', 'clap']]
+# Type alias for hit sounds. Tuples are immutable, so hit objects share them.
+HitSound = Tuple[Literal['normal', 'whistle', 'finish', 'clap'], ...]
 
+# Hit sound for each hitsound bit, from the lowest bit up
+_HITSOUND_NAMES: HitSound = ('normal', 'whistle', 'finish', 'clap')
 
-@dataclass
+
+def _hitsounds_for_flags(flags: int) -> HitSound:
+    """Get the hit sounds played for the given hitsound bit flags."""
+    sounds: HitSound = tuple(
+        sound for bit, sound in enumerate(_HITSOUND_NAMES)
+        if (flags >> bit) & 0b1
+    )
+    return sounds or ('normal',)
+
+
+# Hit sounds for every combination of the 4 hitsound bits, shared by all hit objects
+_HITSOUND_TABLE: List[HitSound] = [_hitsounds_for_flags(i) for i in range(16)]
+
+
+def _parse_beat_length(value: AnyStr) -> float:
+    """Parse the beat length field of a timing point line, given as str or bytes."""
+    beat_length = float(value)
+    if beat_length == 0:
+        raise ValueError("Timing point has a beat length of 0!")
+    return beat_length
+
+
+@lru_cache(maxsize=256)
+def _bpm(beat_length: float) -> int:
+    """Get the bpm of a beat length, rounded to the nearest whole."""
+    # A beatmap only uses a handful of distinct beat lengths, so this is cached
+    return round(60000 / beat_length)
+
+
+@dataclass(slots=True)
 class TimingPoint:
     """
     Represents a timing point in an osu! beatmap.
@@ -45,13 +82,14 @@ class TimingPoint:
     @staticmethod
     def parse(line: str) -> TimingPoint:
         """Parse a timing point from a line in the beatmap file."""
-        members = line.split(',')
-        beat_length = float(members[1])
+        # Cap the split after the 8 fields read below
+        members = line.split(',', 8)
+        beat_length = _parse_beat_length(members[1])
         bpm = 0
         velocity = 1.0
 
         if beat_length > 0:
-            bpm = round(60000 / beat_length)
+            bpm = _bpm(beat_length)
         else:
             velocity = abs(100 / beat_length)
 
@@ -71,7 +109,32 @@ class TimingPoint:
         )
 
 
-@dataclass
+def _parse_hit_object_fields(line: AnyStr) -> Tuple[int, int, int, int, int, int]:
+    """
+    Parse the numeric fields of a hit object line, without creating a HitObject.
+
+    The line may be a str, or bytes read straight from a memory-mapped file.
+    Returns x, y, time, end_time, type_flags and hitsound_flags, in the order
+    HitObject.from_fields takes them.
+    """
+    comma, colon = (',', ':') if isinstance(line, str) else (b',', b':')
+
+    # Fields past the hitsound stay joined; only the end time is read from them
+    members = line.split(comma, 5)
+    time = int(members[2])
+    type_flags = int(members[3])
+
+    if (type_flags & 0b1) != 0:
+        end_time = time
+    elif (type_flags & 0b10000000) != 0:
+        end_time = int(members[5].partition(colon)[0])
+    else:
+        raise ValueError("Unknown hit object type!")
+
+    return int(members[0]), int(members[1]), time, end_time, type_flags, int(members[4])
+
+
+@dataclass(slots=True)
 class HitObject:
     """
     Represents a hit object in an osu!mania beatmap.
@@ -92,54 +155,97 @@ class HitObject:
     @staticmethod
     def parse(line: str) -> HitObject:
         """Parse a hit object from a line in the beatmap file."""
-        members = line.split(',')
-        type_flags = int(members[3])
+        return HitObject.from_fields(*_parse_hit_object_fields(line))
 
-        note = (type_flags & 0b1) != 0
-        hold = (type_flags & 0b10000000) != 0
+    @staticmethod
+    def from_fields(x: int, y: int, time: int, end_time: int,
+                    type_flags: int, hitsound_flags: int) -> HitObject:
+        """
+        Build a hit object from its raw numeric fields.
+
+        The fields are expected to come from _parse_hit_object_fields, which
+        already rejects hit objects that are neither notes nor holds.
+        """
+        hit_type: Literal['note', 'hold'] = 'note' if (type_flags & 0b1) != 0 else 'hold'
 
         new_combo = (type_flags & 0b100) != 0
         combo_colors_skipped = (type_flags & 0b11100) // 4
 
-        hitsound_flags = int(members[4])
-        hitsounds: HitSound = []
-
-        if (hitsound_flags & 0b1) != 0:
-            hitsounds.append('normal')
-        if (hitsound_flags & 0b10) != 0:
-            hitsounds.append('whistle')
-        if (hitsound_flags & 0b100) != 0:
-            hitsounds.append('finish')
-        if (hitsound_flags & 0b1000) != 0:
-            hitsounds.append('clap')
-
-        if len(hitsounds) == 0:
-            hitsounds.append('normal')
-
-        if note:
-            return HitObject(
-                type='note',
-                hit_sound=hitsounds,
-                new_combo=new_combo,
-                combo_colors_skipped=combo_colors_skipped,
-                x=int(members[0]),
-                y=int(members[1]),
-                time=int(members[2]),
-                end_time=int(members[2])
-            )
-        elif hold:
-            return HitObject(
-                type='hold',
-                hit_sound=hitsounds,
-                new_combo=new_combo,
-                combo_colors_skipped=combo_colors_skipped,
-                x=int(members[0]),
-                y=int(members[1]),
-                time=int(members[2]),
-                end_time=int(members[5].split(':')[0])
-            )
-        else:
-            raise ValueError("Unknown hit object type!")
+        hitsounds = _HITSOUND_TABLE[hitsound_flags & 0b1111]
+
+        return HitObject(
+            type=hit_type,
+            hit_sound=hitsounds,
+            new_combo=new_combo,
+            combo_colors_skipped=combo_colors_skipped,
+            x=x,
+            y=y,
+            time=time,
+            end_time=end_time
+        )
+
+
+class HitObjectArrays:
+    """
+    Column-oriented storage for the hit objects of a beatmap.
+
+    Each field is kept in its own typed array instead of one HitObject per note,
+    which keeps large beatmaps compact for batch analysis. Indexing returns a
+    HitObject built on demand.
+    """
+
+    def __init__(self) -> None:
+        # Position in osu! pixels of each object.
+        self.x = array('i')
+        # Position in osu! pixels of each object.
+        self.y = array('i')
+        # Time when each object is to be hit, in milliseconds.
+        self.time = array('i')
+        # End time of each object, in milliseconds; equal to time for notes.
+        self.end_time = array('i')
+        # Raw type bit flags of each object.
+        self.type_flags = array('H')
+        # Raw hitsound bit flags of each object.
+        self.hitsound_flags = array('H')
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def __getitem__(self, index: int) -> HitObject:
+        return HitObject.from_fields(
+            x=self.x[index],
+            y=self.y[index],
+            time=self.time[index],
+            end_time=self.end_time[index],
+            type_flags=self.type_flags[index],
+            hitsound_flags=self.hitsound_flags[index]
+        )
+
+    def __iter__(self) -> Iterator[HitObject]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nb_notes(self) -> int:
+        """Number of notes."""
+        return sum(1 for flags in self.type_flags if flags & 0b1)
+
+    @property
+    def nb_holds(self) -> int:
+        """Number of hold notes."""
+        # Objects with the note bit set count as notes, like in HitObject
+        return len(self) - self.nb_notes
+
+    def add_line(self, line: AnyStr) -> None:
+        """Add a hit object from a line in the beatmap file, as str or bytes."""
+        x, y, time, end_time, type_flags, hitsound_flags = _parse_hit_object_fields(line)
+
+        self.x.append(x)
+        self.y.append(y)
+        self.time.append(time)
+        self.end_time.append(end_time)
+        self.type_flags.append(type_flags)
+        self.hitsound_flags.append(hitsound_flags)
 
 
 @dataclass
@@ -186,28 +292,35 @@ class Beatmap:
     # List of hit objects in the beatmap
     hit_objects: List[HitObject] = field(default_factory=list)
 
+    def __post_init__(self) -> None:
+        # Index returned by the last get_timing_point call
+        self._tp_last_index = 0
+
     def get_timing_point(self, time: int) -> TimingPoint:
         """Get the timing point active at the given time."""
-        for i in range(len(self.timing_points) - 1, -1, -1):
-            if self.timing_points[i].time <= time:
-                return self.timing_points[i]
-        return self.timing_points[0]
+        timing_points = self.timing_points
+
+        # Queries usually move forward in time, so try the last answer first
+        i = self._tp_last_index
+        if (i < len(timing_points) and timing_points[i].time <= time
+                and (i + 1 == len(timing_points) or timing_points[i + 1].time > time)):
+            return timing_points[i]
+
+        i = max(bisect_right(timing_points, time, key=attrgetter('time')) - 1, 0)
+        self._tp_last_index = i
+        return timing_points[i]
 
     def add_timing_point(self, line: str) -> None:
         """Add a timing point from a line in the beatmap file."""
         timing_point = TimingPoint.parse(line)
 
-        bpm = timing_point.bpm if timing_point.bpm is not None else 0
-
-        if self.min_bpm == 0:
-            self.min_bpm = bpm
-        elif timing_point.bpm is not None and self.min_bpm > timing_point.bpm:
-            self.min_bpm = bpm
-
-        if self.max_bpm == 0:
-            self.max_bpm = bpm
-        elif timing_point.bpm is not None and self.max_bpm < timing_point.bpm:
-            self.max_bpm = bpm
+        # Inherited timing points have no bpm; min_bpm of 0 means none seen yet
+        bpm = timing_point.bpm
+        if bpm:
+            if bpm < self.min_bpm or self.min_bpm == 0:
+                self.min_bpm = bpm
+            if bpm > self.max_bpm:
+                self.max_bpm = bpm
 
         self.timing_points.append(timing_point)
 
@@ -220,11 +333,78 @@ class Beatmap:
         elif hit_object.type == 'hold':
             self.nb_holds += 1
 
+        # A mania beatmap has at most 18 keys, so the list is cheap to search
         if hit_object.x not in self.key_positions:
             self.key_positions.append(hit_object.x)
 
         self.hit_objects.append(hit_object)
 
+    def add_hit_objects(self, hit_objects: List[HitObject]) -> None:
+        """Add already parsed hit objects to the beatmap in one batch."""
+        nb_notes = 0
+        key_positions = set(self.key_positions)
+
+        for hit_object in hit_objects:
+            if hit_object.type == 'note':
+                nb_notes += 1
+            if hit_object.x not in key_positions:
+                key_positions.add(hit_object.x)
+                self.key_positions.append(hit_object.x)
+
+        self.nb_notes += nb_notes
+        self.nb_holds += len(hit_objects) - nb_notes
+
+        self.hit_objects.extend(hit_objects)
+
+
+@dataclass(slots=True)
+class BeatmapSummary:
+    """
+    Summary statistics of an osu!mania beatmap.
+    """
+    # x positions of each key, arranged in ascending order
+    key_positions: List[int] = field(default_factory=list)
+    # Slowest bpm of the beatmap
+    min_bpm: int = 0
+    # Fastest bpm of the beatmap
+    max_bpm: int = 0
+    # Number of notes in the beatmap
+    nb_notes: int = 0
+    # Number of hold notes in the beatmap
+    nb_holds: int = 0
+
+
+# Stores the value of a "Key: value" line on a beatmap
+_Setter = Callable[[Beatmap, str], None]
+
+
+def _check_mode(beatmap: Beatmap, value: str) -> None:
+    if value != '3':
+        raise ValueError("Beatmap's game mode is not set to osu!mania.")
+
+
+# Setters for the keys read from the [General], [Metadata] and [Difficulty] sections
+_GENERAL_SETTERS: Dict[str, _Setter] = {
+    "Mode": _check_mode,
+    "PreviewTime": lambda beatmap, value: setattr(beatmap, 'preview_time', int(value)),
+}
+
+_METADATA_SETTERS: Dict[str, _Setter] = {
+    "Title": lambda beatmap, value: setattr(beatmap, 'title', value),
+    "Artist": lambda beatmap, value: setattr(beatmap, 'artist', value),
+    "Creator": lambda beatmap, value: setattr(beatmap, 'creator', value),
+    "Version": lambda beatmap, value: setattr(beatmap, 'version', value),
+    "Tags": lambda beatmap, value: setattr(beatmap, 'tags', value.split(' ')),
+    "BeatmapID": lambda beatmap, value: setattr(beatmap, 'map_id', int(value)),
+    "BeatmapSetID": lambda beatmap, value: setattr(beatmap, 'mapset_id', int(value)),
+}
+
+_DIFFICULTY_SETTERS: Dict[str, _Setter] = {
+    "HPDrainRate": lambda beatmap, value: setattr(beatmap, 'hp_drain', float(value)),
+    "CircleSize": lambda beatmap, value: setattr(beatmap, 'key_count', int(value)),
+    "OverallDifficulty": lambda beatmap, value: setattr(beatmap, 'difficulty', float(value)),
+}
+
 
 def parse_file_sync(path: str) -> Beatmap:
     """
@@ -240,75 +420,216 @@ def parse_file_sync(path: str) -> Beatmap:
         FileNotFoundError: If the file does not exist
         ValueError: If the beatmap's game mode is not osu!mania
     """
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"File at {path} does not exist!")
-
     beatmap = Beatmap()
-    section_reg = r'^\[([a-zA-Z0-9]+)\]$'
 
-    import re
+    def key_value_parser(setters: Dict[str, _Setter], separator: str,
+                         skip_rest: bool = False) -> Callable[[str], None]:
+        keys_left = set(setters)
+
+        def parse(line: str) -> None:
+            nonlocal current_handler
+            key, _, value = line.partition(separator)
+            setter = setters.get(key)
+            if setter is not None:
+                setter(beatmap, value)
+                keys_left.discard(key)
+                # Every key we use has been read; skip the rest of the section
+                if skip_rest and not keys_left:
+                    current_handler = None
+        return parse
+
+    # Hit objects are collected here and added to the beatmap in one batch
+    hit_objects: List[HitObject] = []
+    append_hit_object = hit_objects.append
+
+    def parse_hit_object(line: str) -> None:
+        append_hit_object(HitObject.parse(line))
+
+    # Line handler for each section we read; other sections are skipped
+    handlers: Dict[str, Callable[[str], None]] = {
+        # [General] has many keys but only Mode and PreviewTime are used, so it
+        # stops being read once both are seen
+        "General": key_value_parser(_GENERAL_SETTERS, ": ", skip_rest=True),
+        "Metadata": key_value_parser(_METADATA_SETTERS, ":"),
+        "Difficulty": key_value_parser(_DIFFICULTY_SETTERS, ":"),
+        "TimingPoints": beatmap.add_timing_point,
+        "HitObjects": parse_hit_object,
+    }
+    current_handler: Optional[Callable[[str], None]] = None
+
+    # Stream the file line by line rather than reading it whole, so only one
+    # line is held in memory at a time. A 1 MiB buffer fits most beatmaps in a
+    # single read. Line endings are left untranslated (newline='') since both
+    # \r\n and \n are stripped below.
+    with open(path, 'r', encoding='utf-8', newline='', buffering=1 << 20) as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+
+            # Skip comments and empty lines
+            if line == '' or line.startswith('//'):
+                continue
+
+            # Section headers look like [HitObjects]
+            if line[0] == '[' and line[-1] == ']':
+                current_handler = handlers.get(line[1:-1])
+            elif current_handler is not None:
+                current_handler(line)
+
+    beatmap.add_hit_objects(hit_objects)
+    beatmap.key_positions.sort()
+
+    return beatmap
 
-    with open(path, 'r', encoding='utf-8') as f:
-        contents = f.read()
 
-    # Split by \r\n (Windows line endings) and filter out comments and empty lines
-    lines = [
-        line for line in contents.split('\r\n')
-        if not line.startswith('//') and line != ''
-    ]
+def load_hit_objects(path: str) -> HitObjectArrays:
+    """
+    Loads only the hit objects of an osu!mania beatmap file, in column form.
 
-    section_to_read = ""
+    Unlike parse_file_sync, no HitObject is created per note, which makes this
+    the cheaper choice when analysing many beatmaps in bulk.
 
-    for line in lines:
-        match = re.match(section_reg, line)
-        if match is not None:
-            section_to_read = match.group(1)
+    Args:
+        path: The file path of the osu!mania beatmap
+
+    Returns:
+        A HitObjectArrays containing the beatmap's hit objects
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+    """
+    hit_objects = HitObjectArrays()
+
+    with _map_file(path) as data:
+        for line in _section_lines(data, b'HitObjects'):
+            hit_objects.add_line(line)
+
+    return hit_objects
+
+
+def parse_summary(path: str) -> BeatmapSummary:
+    """
+    Reads only the summary statistics of an osu!mania beatmap file.
+
+    No TimingPoint or HitObject is created and no text is decoded, so this is
+    much cheaper than parse_file_sync when the individual objects are not needed.
+
+    Args:
+        path: The file path of the osu!mania beatmap
+
+    Returns:
+        A BeatmapSummary of the beatmap
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If the beatmap's game mode is not osu!mania
+    """
+    summary = BeatmapSummary()
+    key_positions: Set[int] = set()
+
+    with _map_file(path) as data:
+        for line in _section_lines(data, b'General'):
+            key, _, value = line.partition(b': ')
+            if key == b'Mode':
+                if value != b'3':
+                    raise ValueError("Beatmap's game mode is not set to osu!mania.")
+                break
+
+        for line in _section_lines(data, b'TimingPoints'):
+            beat_length = _parse_beat_length(line.split(b',', 2)[1])
+            if beat_length > 0:
+                bpm = _bpm(beat_length)
+                if bpm < summary.min_bpm or summary.min_bpm == 0:
+                    summary.min_bpm = bpm
+                if bpm > summary.max_bpm:
+                    summary.max_bpm = bpm
+
+        for line in _section_lines(data, b'HitObjects'):
+            x, _, _, _, type_flags, _ = _parse_hit_object_fields(line)
+
+            # Anything that is not a note is a hold; other types were rejected above
+            if (type_flags & 0b1) != 0:
+                summary.nb_notes += 1
+            else:
+                summary.nb_holds += 1
+
+            key_positions.add(x)
+
+    summary.key_positions = sorted(key_positions)
+
+    return summary
+
+
+@contextmanager
+def _map_file(path: str) -> Iterator[Union[bytes, mmap.mmap]]:
+    """Memory-map a file for reading. Empty files, which cannot be mapped, give b''."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def _section_lines(data: Union[bytes, mmap.mmap], name: bytes) -> Iterator[bytes]:
+    """Iterate over the lines of a section, skipping comments and empty lines."""
+    start = _section_start(data, name)
+    if start == -1:
+        return
+
+    # The section ends at the next line starting with '[', i.e. the next section header
+    end = len(data)
+    for ending in (b'\n[', b'\r['):
+        found = data.find(ending, start, end)
+        if found != -1:
+            end = found
+
+    # Walk the lines in place so only one line is copied out of the map at a
+    # time. Lines may end with \r\n, \n or \r, the same endings parse_file_sync accepts.
+    pos = start
+    next_lf = data.find(b'\n', pos, end)
+    next_cr = data.find(b'\r', pos, end)
+
+    while pos < end:
+        # Only search again once the previous match has been passed, so the
+        # section is scanned once per line ending kind
+        if next_lf != -1 and next_lf < pos:
+            next_lf = data.find(b'\n', pos, end)
+        if next_cr != -1 and next_cr < pos:
+            next_cr = data.find(b'\r', pos, end)
+
+        if next_lf == -1:
+            eol = end if next_cr == -1 else next_cr
+        elif next_cr == -1:
+            eol = next_lf
         else:
-            if section_to_read == "General":
-                gen = line.split(": ")
-                gen.append('')
-                if gen[0] == "Mode":
-                    if gen[1] != '3':
-                        raise ValueError("Beatmap's game mode is not set to osu!mania.")
-                elif gen[0] == "PreviewTime":
-                    beatmap.preview_time = int(gen[1])
-
-            elif section_to_read == "Metadata":
-                mdata = line.split(":")
-                if mdata[0] == "Title":
-                    beatmap.title = mdata[1]
-                elif mdata[0] == "Artist":
-                    beatmap.artist = mdata[1]
-                elif mdata[0] == "Creator":
-                    beatmap.creator = mdata[1]
-                elif mdata[0] == "Version":
-                    beatmap.version = mdata[1]
-                elif mdata[0] == "Tags":
-                    beatmap.tags = mdata[1].split(' ')
-                elif mdata[0] == "BeatmapID":
-                    beatmap.map_id = int(mdata[1])
-                elif mdata[0] == "BeatmapSetID":
-                    beatmap.mapset_id = int(mdata[1])
-
-            elif section_to_read == "Difficulty":
-                diff = line.split(":")
-                diff.append('')
-                if diff[0] == "HPDrainRate":
-                    beatmap.hp_drain = float(diff[1])
-                elif diff[0] == "CircleSize":
-                    beatmap.key_count = int(diff[1])
-                elif diff[0] == "OverallDifficulty":
-                    beatmap.difficulty = float(diff[1])
-
-            elif section_to_read == "TimingPoints":
-                beatmap.add_timing_point(line)
-
-            elif section_to_read == "HitObjects":
-                beatmap.add_hit_object(line)
+            eol = min(next_lf, next_cr)
 
-    beatmap.key_positions.sort()
+        line = data[pos:eol]
+        pos = eol + 1
+        if eol == next_cr and pos == next_lf:
+            pos += 1
 
-    return beatmap
+        if line == b'' or line.startswith(b'//'):
+            continue
+
+        yield line
+
+
+def _section_start(data: Union[bytes, mmap.mmap], name: bytes) -> int:
+    """Get the offset just past a section's header, or -1 if the section is missing."""
+    header = b'[' + name + b']'
+    pos = data.find(header)
+
+    while pos != -1:
+        after = pos + len(header)
+        # The header must make up a whole line, as in parse_file_sync
+        if ((pos == 0 or data[pos - 1] in b'\r\n')
+                and (after == len(data) or data[after] in b'\r\n')):
+            return after
+        pos = data.find(header, pos + 1)
+
+    return -1
 
 
 # For convenience, also provide a function alias matching Python naming conventions
@@ -0,0 +1,201 @@
+"""
+Tests for the osu!mania beatmap parser.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import osu_mania_parser as parser  # noqa: E402
+
+
+BEATMAP_LINES = [
+    "osu file format v14",
+    "",
+    "[General]",
+    "AudioFilename: audio.mp3",
+    "PreviewTime: 1500",
+    "Mode: 3",
+    "",
+    "[Metadata]",
+    "Title:Song",
+    "Version:Hard",
+    "BeatmapID:1",
+    "BeatmapSetID:2",
+    "",
+    "[Difficulty]",
+    "HPDrainRate:8",
+    "CircleSize:4",
+    "OverallDifficulty:8",
+    "",
+    "[Events]",
+    "//Background and Video events",
+    "",
+    "[TimingPoints]",
+    "100,500,4,2,1,60,1,0",
+    "1100,-50,4,2,1,60,0,1",
+    "2100,250,4,2,1,60,1,0",
+    "3100,375,4,2,1,60,1,4",
+    "",
+    "[HitObjects]",
+    "448,192,100,1,0,0:0:0:0:",
+    "64,192,350,128,2,600:0:0:0:0:",
+    "192,192,600,5,8,0:0:0:0:",
+    "320,192,1100,1,3,0:0:0:0:",
+    "64,192,2100,128,0,2400:0:0:0:0:",
+    "448,192,3100,1,15,0:0:0:0:",
+]
+
+LINE_ENDINGS = {'lf': '\n', 'crlf': '\r\n', 'cr': '\r'}
+
+
+class BeatmapFileTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_beatmap(self, name: str, contents: str) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(contents)
+        return path
+
+
+class BulkReaderTest(BeatmapFileTestCase):
+
+    def beatmap_paths(self):
+        for name, ending in LINE_ENDINGS.items():
+            yield self.write_beatmap(f'{name}.osu', ending.join(BEATMAP_LINES) + ending)
+
+        # A section header on the very first line, and no final line ending
+        hit_objects = BEATMAP_LINES[BEATMAP_LINES.index("[HitObjects]"):]
+        yield self.write_beatmap('first_line.osu', '\n'.join(hit_objects))
+
+    def test_readers_give_expected_values(self) -> None:
+        path = self.write_beatmap('expected.osu', '\n'.join(BEATMAP_LINES))
+        beatmap = parser.parse_file_sync(path)
+        summary = parser.parse_summary(path)
+        hit_objects = list(parser.load_hit_objects(path))
+
+        for reader, stats in (('parse_file_sync', beatmap), ('parse_summary', summary)):
+            with self.subTest(reader=reader):
+                self.assertEqual(stats.min_bpm, 120)
+                self.assertEqual(stats.max_bpm, 240)
+                self.assertEqual(stats.key_positions, [64, 192, 320, 448])
+                self.assertEqual(stats.nb_notes, 4)
+                self.assertEqual(stats.nb_holds, 2)
+
+        for reader, objects in (('parse_file_sync', beatmap.hit_objects),
+                                ('load_hit_objects', hit_objects)):
+            with self.subTest(reader=reader):
+                self.assertEqual([o.type for o in objects],
+                                 ['note', 'hold', 'note', 'note', 'hold', 'note'])
+                self.assertEqual(objects[2].hit_sound, ('clap',))
+                self.assertEqual(objects[3].hit_sound, ('normal', 'whistle'))
+                self.assertEqual(objects[5].hit_sound, ('normal', 'whistle', 'finish', 'clap'))
+                self.assertEqual(objects[1].end_time, 600)
+                self.assertEqual(objects[4].end_time, 2400)
+                self.assertEqual(objects[0].end_time, objects[0].time)
+
+    def test_parse_summary_matches_parse_file_sync(self) -> None:
+        for path in self.beatmap_paths():
+            with self.subTest(path=os.path.basename(path)):
+                beatmap = parser.parse_file_sync(path)
+                summary = parser.parse_summary(path)
+
+                self.assertGreater(beatmap.nb_notes, 0)
+                self.assertEqual(summary.key_positions, beatmap.key_positions)
+                self.assertEqual(summary.min_bpm, beatmap.min_bpm)
+                self.assertEqual(summary.max_bpm, beatmap.max_bpm)
+                self.assertEqual(summary.nb_notes, beatmap.nb_notes)
+                self.assertEqual(summary.nb_holds, beatmap.nb_holds)
+
+    def test_load_hit_objects_matches_parse_file_sync(self) -> None:
+        for path in self.beatmap_paths():
+            with self.subTest(path=os.path.basename(path)):
+                beatmap = parser.parse_file_sync(path)
+                hit_objects = parser.load_hit_objects(path)
+
+                self.assertGreater(len(beatmap.hit_objects), 0)
+                self.assertEqual(list(hit_objects), beatmap.hit_objects)
+                self.assertEqual(hit_objects.nb_notes, beatmap.nb_notes)
+                self.assertEqual(hit_objects.nb_holds, beatmap.nb_holds)
+
+    def test_parse_summary_rejects_other_modes(self) -> None:
+        lines = [("Mode: 1" if line == "Mode: 3" else line) for line in BEATMAP_LINES]
+        path = self.write_beatmap('taiko.osu', '\n'.join(lines))
+
+        with self.assertRaises(ValueError):
+            parser.parse_summary(path)
+
+    def test_zero_beat_length_is_rejected_by_both_readers(self) -> None:
+        lines = [("0,0,4,2,1,60,1,0" if line == "100,500,4,2,1,60,1,0" else line)
+                 for line in BEATMAP_LINES]
+        path = self.write_beatmap('zero_beat_length.osu', '\n'.join(lines))
+
+        with self.assertRaises(ValueError):
+            parser.parse_file_sync(path)
+        with self.assertRaises(ValueError):
+            parser.parse_summary(path)
+
+
+class MetadataTest(BeatmapFileTestCase):
+
+    def test_values_containing_colons_are_kept_whole(self) -> None:
+        lines = [("Version:Hard: extra" if line == "Version:Hard" else line)
+                 for line in BEATMAP_LINES]
+        path = self.write_beatmap('colon.osu', '\n'.join(lines))
+
+        beatmap = parser.parse_file_sync(path)
+
+        self.assertEqual(beatmap.version, "Hard: extra")
+        self.assertEqual(beatmap.title, "Song")
+
+
+class TimingPointLookupTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.beatmap = parser.Beatmap()
+        for line in [
+            "100,500,4,2,1,60,1,0",
+            "1100,-50,4,2,1,60,0,0",
+            # An uninherited and an inherited point at the same time
+            "2100,250,4,2,1,60,1,0",
+            "2100,-200,4,2,1,60,0,0",
+            "3100,375,4,2,1,60,1,0",
+        ]:
+            self.beatmap.add_timing_point(line)
+
+    def linear_lookup(self, time: int) -> parser.TimingPoint:
+        """The reverse linear scan get_timing_point used before bisecting."""
+        timing_points = self.beatmap.timing_points
+        for i in range(len(timing_points) - 1, -1, -1):
+            if timing_points[i].time <= time:
+                return timing_points[i]
+        return timing_points[0]
+
+    def test_matches_linear_scan(self) -> None:
+        forward = [0, 99, 100, 101, 1099, 1100, 2099, 2100, 2101, 3100, 5000]
+        # Queries moving backwards after forward ones exercise the cached index
+        backward = [4000, 3099, 2100, 1500, 100, 50, 2100, 2100, 3100, 99]
+
+        for time in forward + backward:
+            with self.subTest(time=time):
+                self.assertIs(self.beatmap.get_timing_point(time), self.linear_lookup(time))
+
+    def test_tied_times_give_the_last_point(self) -> None:
+        timing_point = self.beatmap.get_timing_point(2100)
+
+        self.assertIs(timing_point, self.beatmap.timing_points[3])
+        self.assertFalse(timing_point.uninherited)
+
+    def test_before_first_point_gives_the_first_point(self) -> None:
+        self.assertIs(self.beatmap.get_timing_point(-500), self.beatmap.timing_points[0])
+
+
+if __name__ == '__main__':
+    unittest.main()